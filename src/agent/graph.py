@@ -1,15 +1,17 @@
 """
 This module uses LangGraph to define a multi-agent orchestration workflow.
 It includes nodes for Planning, Research, Analysis, Formatting, and Chat, 
-coordinated by a dynamic Supervisor. State is persisted via SQLite.
+coordinated by a dynamic Supervisor. State is persisted via LMDB (or SQLite as a fallback).
 """
-from typing import TypedDict, Literal, List, Annotated, Dict
+from typing import TypedDict, Literal, List, Annotated, Dict, Tuple, Optional
 import os, sys
-import json
+import re
+import string
+import orjson
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 from langgraph.graph import StateGraph, END, add_messages
-from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from langgraph.prebuilt import create_react_agent
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, ToolMessage
 from langchain_openai import ChatOpenAI
@@ -28,8 +30,17 @@ DATA_DIR = os.path.join(root_dir, "data")
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
-DB_PATH = os.path.join(DATA_DIR, "checkpoints.db")
-# memory = AsyncSqliteSaver.from_conn_string(DB_PATH) # Moved to server/client lifecycle
+LMDB_PATH = os.path.join(DATA_DIR, "checkpoints.lmdb")
+DB_PATH = os.path.join(DATA_DIR, "checkpoints.db") # Legacy SQLite fallback (CHECKPOINT_BACKEND=sqlite)
+
+# WAL lets readers proceed while a single writer appends; a larger page cache keeps state reads in RAM.
+SQLITE_WAL_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA cache_size=-65536;",
+    "PRAGMA wal_autocheckpoint=1000;",
+    "PRAGMA temp_store=MEMORY;",
+)
 
 from agent.tools import (
     save_file, get_arxiv_details, save_as_pdf, read_url,
@@ -39,7 +50,7 @@ from agent.prompts import (
     SYSTEM_CONTEXT, SUPERVISOR_PROMPT, PLANNER_PROMPT, RESEARCHER_PROMPT,
     ANALYST_PROMPT, FORMATTER_PROMPT, VECTOR_MANAGER_PROMPT, CHAT_PROMPT
 )
-from agent.logging_utils import log_activity, log_system_event
+from agent.logging_utils import format_activity, log_entries, log_system_event
 from langsmith import traceable
 
 # Load env
@@ -54,17 +65,32 @@ if os.getenv("LANGCHAIN_TRACING_V2") == "true":
 else:
     print("ℹ️ LangSmith Tracing is DISABLED. Set LANGCHAIN_TRACING_V2=true to enable.")
 
+def _maybe_traceable(**kwargs):
+    """Applies `@traceable` only when tracing is enabled; otherwise returns the node function unchanged."""
+    if os.getenv("LANGCHAIN_TRACING_V2") == "true":
+        return traceable(**kwargs)
+    return lambda f: f
+
 # --- Configuration ---
+# Max task-block messages sent to the Supervisor LLM (0 = unbounded)
+SUPERVISOR_HISTORY_LIMIT = int(os.getenv("SUPERVISOR_HISTORY_LIMIT", "12"))
+
 llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, streaming=True)
 # llm = ChatOllama(model="llama3.1:8b", temperature=0, streaming=True)
 
 # --- State Definition ---
 def add_actions(left: List[Dict], right: List[Dict]) -> List[Dict]:
-    """Reducer for client_actions list."""
-    if not left: left = []
-    if not right: right = []
+    """Reducer for client_actions list. Reuses either side when the other is empty (the common case)."""
+    if not right:
+        return left or []
+    if not left:
+        return right
     return left + right
 
+def keep_latest(left: Optional[str], right: Optional[str]) -> Optional[str]:
+    """Reducer for last_ai_content: keeps the previous value only when a node reports None (no AIMessage)."""
+    return left if right is None else right
+
 class AgentState(TypedDict):
     """
     Core state for the LangGraph agent workflow.
@@ -79,6 +105,8 @@ class AgentState(TypedDict):
         client_actions: List of side-effect actions (like file downloads) for the client.
         next: The name of the next worker node to route to.
         session_id: The session ID for logging purposes.
+        task_marker_index: Index in `messages` of the latest '--- NEW TASK START' marker (set by the Planner).
+        last_ai_content: Content of the most recent AIMessage, reported by each worker for the Supervisor (None until one is).
     """
     messages: Annotated[List[BaseMessage], add_messages]
     plan: str
@@ -89,6 +117,8 @@ class AgentState(TypedDict):
     client_actions: Annotated[List[Dict], add_actions] # List of actions like {"type": "show_download", "path": "..."}
     next: str
     session_id: str # Added for persistent logging
+    task_marker_index: int # Cached start of the current Task Isolation block
+    last_ai_content: Annotated[Optional[str], keep_latest] # Supervisor's 'LAST ACTION OUTPUT' without scanning history
 
 # --- Structured Output for Planner ---
 class PlanResponse(BaseModel):
@@ -109,10 +139,49 @@ class RouterResponse(BaseModel):
     active_step_description: str = Field(..., description="The text description of the current step from the plan.")
     reasoning: str = Field(..., description="Concise reasoning (max 2 sentences). MUST reference specific evidence in history.")
 
+# --- Supervisor Evidence Patterns ---
+# Inserted by the Planner at the start of each Task Isolation block
+_TASK_MARKER = "--- NEW TASK START"
+# Pre-lowered keywords, matched against each message lowered once
+# Research data present in the task history
+_CONTENT_KWS = ("# aggregated reports", "aggregated reports", "content", "abstract:", "paper 1:", "title:")
+# Analyst has explicitly marked a 'SELECTED:' block for the Formatter
+_SEL_KWS = ("selected:", "selected articles", "selected topic")
+# Saved file path in the Formatter's success message ("... saved successfully to <path>")
+_FILEPATH_RE = re.compile(r"to (.*)$")
+
 # --- Prompts ---
 # Common instruction to prevent agents from hallucinating limitations or providing manual workarounds
 
 
+# --- Structured Output Bindings ---
+# Built once: `llm` is module-global and stateless across calls
+_STRUCTURED_PLANNER = llm.with_structured_output(PlanResponse)
+_STRUCTURED_SUPERVISOR = llm.with_structured_output(RouterResponse)
+
+# --- Precompiled Prompt Templates ---
+def _compile_prompt(template: str):
+    """
+    Parses a `str.format` template once into (literal, field) pairs.
+    
+    The returned callable only joins the pieces with the given keyword values, 
+    so the large Planner/Supervisor prompts are not re-parsed on every hop.
+    Format specs and conversions are not used by these prompts and are rejected 
+    with a ValueError, so an unsupported template fails at import.
+    """
+    parts = []
+    for literal, field, format_spec, conversion in string.Formatter().parse(template):
+        if format_spec or conversion:
+            raise ValueError(f"Prompt field '{{{field}}}' uses a format spec or conversion, which _compile_prompt does not support.")
+        parts.append((literal, field))
+    
+    def render(**values) -> str:
+        return "".join([literal + (str(values[field]) if field is not None else "") for literal, field in parts])
+    return render
+
+_PLANNER_TMPL = _compile_prompt(PLANNER_PROMPT)
+_SUPERVISOR_TMPL = _compile_prompt(SUPERVISOR_PROMPT)
+
 # --- Sub-Agents ---
 researcher_agent = create_react_agent(llm, tools=[search_hn, search_arxiv, get_arxiv_details, read_url])
 analyst_agent = create_react_agent(llm, tools=[]) # Consolidated reasoning
@@ -128,43 +197,117 @@ def strip_old_history(messages: List[BaseMessage]) -> List[BaseMessage]:
     a new goal is defined. This allows workers to focus on the current task 
     without being distracted by previous, unrelated conversations in the thread.
     """
-    for i in range(len(messages) - 1, -1, -1):
-        if isinstance(messages[i], SystemMessage) and "--- NEW TASK START" in str(messages[i].content):
-            return messages[i:]
-    return messages
+    # Exact-type check first (markers are always plain SystemMessages) before touching content
+    offset = next((i for i, m in enumerate(reversed(messages))
+                   if type(m) is SystemMessage and _TASK_MARKER in str(m.content)), None)
+    return messages[len(messages) - 1 - offset:] if offset is not None else messages
 
+def get_task_history(state: AgentState) -> Tuple[List[BaseMessage], int]:
+    """
+    Returns the current task block and its start index using the cached `task_marker_index`.
+    
+    Falls back to a single `strip_old_history` scan for legacy checkpoints that 
+    predate the field; callers write the returned index back into the state.
+    """
+    messages = state['messages']
+    index = state.get("task_marker_index")
+    if index is None or index > len(messages):
+        index = len(messages) - len(strip_old_history(messages))
+    return messages[index:], index
 
-def parse_and_log_tools(session_id: str, agent_name: str, messages: List[BaseMessage]):
-    """Parses messages returned by an agent to log tool calls and results."""
+def get_last_ai_content(messages: List[BaseMessage]) -> Optional[str]:
+    """Returns the content of the last AIMessage in `messages` (possibly ''), or None if there is none."""
+    return next((str(m.content) for m in reversed(messages) if isinstance(m, AIMessage)), None)
 
-    for i, m in enumerate(messages):
+def _scan_state(messages: List[BaseMessage], marker_index: Optional[int] = None, last_ai_content: Optional[str] = None) -> Tuple[List[BaseMessage], int, Optional[str], bool, bool]:
+    """
+    Single reverse pass over `messages` for the Supervisor.
+    
+    Walks back from the tail to the start of the current task block (the cached 
+    `marker_index`, or the latest '--- NEW TASK START' marker when it is unknown), 
+    collecting the content/selection evidence flags along the way. The last AIMessage 
+    content is only searched for when `last_ai_content` is not already known from state.
+    
+    Returns:
+        (relevant_msgs, marker_index, last_ai_content, has_content, has_selection)
+    """
+    if marker_index is not None and marker_index > len(messages):
+        marker_index = None
+    start = marker_index or 0
+    has_content = False
+    has_selection = False
+    for i in range(len(messages) - 1, start - 1, -1):
+        m = messages[i]
+        content = m.content
+        # Content is almost always a plain string; only coerce the rare multi-part list
+        content_str = content if isinstance(content, str) else str(content)
+        if last_ai_content is None and isinstance(m, AIMessage):
+            last_ai_content = content_str
+        if not (has_content and has_selection):
+            cl = content_str.lower()
+            has_content |= any(k in cl for k in _CONTENT_KWS)
+            has_selection |= any(k in cl for k in _SEL_KWS)
+        # Cheap exact-type check first: most messages are not SystemMessages
+        if marker_index is None and type(m) is SystemMessage and _TASK_MARKER in content_str:
+            start = i
+            break
+    # The last AI turn may predate the current task block
+    if last_ai_content is None:
+        last_ai_content = get_last_ai_content(messages[:start])
+    return messages[start:], start, last_ai_content, has_content, has_selection
+
+def retrieve_bounded(msgs: List[BaseMessage], n: int = SUPERVISOR_HISTORY_LIMIT) -> List[BaseMessage]:
+    """
+    Bounds the history sent to an LLM: the `n` most recent messages plus any older SystemMessage markers.
+    
+    The tail never starts on a ToolMessage: it is extended back to the AIMessage that 
+    issued the tool call so the tool chain stays valid for the API. The New Task marker 
+    (which carries the goal) is kept via the SystemMessage rule.
+    
+    Only the dropped message count is logged: a len(content)//4 token estimate would 
+    re-read every dropped message on each Supervisor hop, so it is intentionally omitted.
+    """
+    if n <= 0 or len(msgs) <= n:
+        return msgs
+    start = len(msgs) - n
+    while start > 0 and isinstance(msgs[start], ToolMessage):
+        start -= 1
+    dropped = msgs[:start]
+    older_system = [m for m in dropped if isinstance(m, SystemMessage)]
+    print(f"DEBUG: Bounded history to {len(msgs) - start} recent messages ({len(dropped)} older messages dropped).")
+    return older_system + msgs[start:]
+
+
+def parse_and_log_tools(session_id: str, agent_name: str, messages: List[BaseMessage]):
+    """Parses messages returned by an agent to log tool calls and results (one batched write)."""
+    entries = []
+    # Index tool outputs once instead of rescanning the tail for every tool call
+    tool_out = {m.tool_call_id: m for m in messages if isinstance(m, ToolMessage)}
+    for m in messages:
         if isinstance(m, AIMessage) and m.tool_calls:
             for tc in m.tool_calls:
                 # Find corresponding tool output
-                output = "No output found."
-                status = "Unknown"
-                for next_m in messages[i+1:]:
-                    if isinstance(next_m, ToolMessage) and next_m.tool_call_id == tc['id']:
-                        output = str(next_m.content)
-                        status = "SUCCESS" if "error" not in output.lower() else "FAILED"
-                        break
+                tm = tool_out.get(tc['id'])
+                if tm is not None:
+                    output = str(tm.content)
+                    status = "SUCCESS" if "error" not in output.lower() else "FAILED"
+                else:
+                    output = "No output found."
+                    status = "Unknown"
                 
-                log_activity(
-                    session_id=session_id,
+                entries.append(format_activity(
                     agent_name=agent_name,
                     message=f"Output: {output[:500]}...",
                     tool_name=tc['name'],
                     tool_args=tc['args'],
                     status=status
-                )
+                ))
         elif isinstance(m, AIMessage) and not m.tool_calls:
-             log_activity(
-                session_id=session_id,
-                agent_name=agent_name,
-                message=m.content
-            )
+            entries.append(format_activity(agent_name=agent_name, message=m.content))
+    
+    log_entries(session_id, entries)
 
-@traceable(run_type="chain", name="planner_node")
+@_maybe_traceable(run_type="chain", name="planner_node")
 def planner_node(state: AgentState):
     """Generates a plan if one doesn't exist, evaluates if a new plan is needed, or routes to chat."""
     messages = state['messages']
@@ -172,13 +315,12 @@ def planner_node(state: AgentState):
     current_plan = state.get("plan", "")
     is_plan_done = state.get("is_plan_done", False)
 
-    planner_prompt = PLANNER_PROMPT.format(
+    planner_prompt = _PLANNER_TMPL(
         current_plan=current_plan if current_plan else 'None',
         is_plan_done=is_plan_done
     )
     
-    structured_planner = llm.with_structured_output(PlanResponse)
-    response = structured_planner.invoke(
+    response = _STRUCTURED_PLANNER.invoke(
         [SystemMessage(content=planner_prompt), HumanMessage(content=last_msg)],
         config={"tags": ["hidden"]}
     )
@@ -205,14 +347,17 @@ def planner_node(state: AgentState):
     
     # Context Preservation: Only start a "New Task Block" if it's NOT a continuation
     new_messages = []
+    res = {}
     if not response.is_continuation:
-        marker = SystemMessage(content=f"--- NEW TASK START: {last_msg} ---")
+        marker = SystemMessage(content=f"{_TASK_MARKER}: {last_msg} ---")
         new_messages.append(marker)
+        res["task_marker_index"] = len(messages) # Marker is appended right after the existing history
         log_system_event(sid, "PLAN_CREATED", f"New Goal: {last_msg}")
     else:
         log_system_event(sid, "PLAN_CONTINUED", f"Refining goal: {last_msg}")
     
     return {
+        **res,
         "messages": new_messages,
         "plan": plan_str,
         "active_step_index": 0,
@@ -224,7 +369,7 @@ def planner_node(state: AgentState):
         "session_id": sid # Ensure it's passed if it was in state
     }
 
-@traceable(run_type="chain", name="supervisor_node")
+@_maybe_traceable(run_type="chain", name="supervisor_node")
 def supervisor_node(state: AgentState):
     """Dynamic State-Based Supervisor."""
     
@@ -238,21 +383,21 @@ def supervisor_node(state: AgentState):
     if not plan or is_plan_done:
          return {"next": "planner"}
 
-    last_ai_msgs = [m.content for m in messages if isinstance(m, AIMessage)]
-    last_action = last_ai_msgs[-1] if last_ai_msgs else "None"
+    # Filter history to keep context clean but DO NOT blindly slice (breaking tool chains)
+    relevant_msgs, task_marker_index, last_ai, has_content, has_selection = _scan_state(
+        messages, state.get("task_marker_index"), state.get("last_ai_content")
+    )
+    last_action = last_ai if last_ai is not None else "None"
     
-    system_prompt = SUPERVISOR_PROMPT.format(
+    system_prompt = _SUPERVISOR_TMPL(
         active_step_index=active_step_index,
         active_step_description=state.get('active_step_description', 'Execute Plan'),
         plan=plan,
         last_action=last_action
     )
     
-    structured_llm = llm.with_structured_output(RouterResponse)
-    # Filter history to keep context clean but DO NOT blindly slice (breaking tool chains)
-    relevant_msgs = strip_old_history(messages)
-    response = structured_llm.invoke(
-        [SystemMessage(content=system_prompt)] + relevant_msgs,
+    response = _STRUCTURED_SUPERVISOR.invoke(
+        [SystemMessage(content=system_prompt)] + retrieve_bounded(relevant_msgs),
         config={"tags": ["hidden"]}
     )
     
@@ -264,17 +409,7 @@ def supervisor_node(state: AgentState):
     # --- Safety Overrides & Validation Logic ---
     # The LLM supervisor can sometimes make logical errors (e.g. routing to Formatter 
     # before data is selected). These overrides enforce strict sequential dependencies.
-    
-    has_content = False
-    has_selection = False
-    for m in relevant_msgs:
-        content_str = str(m.content)
-        # Check if we have actual research data in history
-        if any(keyword.lower() in content_str.lower() for keyword in ["# Aggregated Reports", "Aggregated Reports", "CONTENT", "Abstract:", "Paper 1:", "Title:"]):
-            has_content = True
-        # Check if the Analyst has explicitly marked a 'SELECTED:' block for the Formatter
-        if "SELECTED:" in content_str.upper() or "SELECTED ARTICLES" in content_str.upper() or "SELECTED TOPIC" in content_str.upper():
-            has_selection = True
+    # `has_content` / `has_selection` were collected by `_scan_state` above.
             
     # Dependency Check A: Formatter requires Analyst selection
     if response.next_worker == "Formatter" and not has_selection:
@@ -337,20 +472,20 @@ def supervisor_node(state: AgentState):
         "next": response.next_worker,
         "active_step_index": target_index, 
         "active_step_description": active_description,
-        "current_step_retries": new_retries
+        "current_step_retries": new_retries,
+        "task_marker_index": task_marker_index
     }
     
     # Log the routing decision for audit
     sid = state.get("session_id", "unknown")
-    import json
-    log_system_event(sid, "SUPERVISOR_ROUTING", json.dumps(res))
+    log_system_event(sid, "SUPERVISOR_ROUTING", orjson.dumps(res).decode())
     
     if response.next_worker == "FINISH":
         res["is_plan_done"] = True
         
     return res
 
-@traceable(run_type="chain", name="researcher_node")
+@_maybe_traceable(run_type="chain", name="researcher_node")
 def researcher_node(state: AgentState):
     """
     Executes the research phase using search tools.
@@ -359,7 +494,7 @@ def researcher_node(state: AgentState):
     2. Invokes the prebuilt React Agent with research tools.
     3. Logs tool usage and results.
     """
-    relevant_msgs = strip_old_history(state['messages'])
+    relevant_msgs, task_marker_index = get_task_history(state)
     messages = [SystemMessage(content=RESEARCHER_PROMPT)] + relevant_msgs
     result = researcher_agent.invoke({"messages": messages})
     # result["messages"] contains the full conversation. Extract NEW messages.
@@ -368,9 +503,9 @@ def researcher_node(state: AgentState):
     
     parse_and_log_tools(state.get("session_id", "unknown"), "Researcher", new_msgs)
     
-    return {"messages": new_msgs}
+    return {"messages": new_msgs, "task_marker_index": task_marker_index, "last_ai_content": get_last_ai_content(new_msgs)}
 
-@traceable(run_type="chain", name="analyst_node")
+@_maybe_traceable(run_type="chain", name="analyst_node")
 def analyst_node(state: AgentState):
     """
     Analyzes and summarizes research findings.
@@ -379,18 +514,18 @@ def analyst_node(state: AgentState):
     2. Selects relevant items (must include valid selection for Formatter).
     3. Generates a summary.
     """
-    relevant_msgs = strip_old_history(state['messages'])
+    relevant_msgs, task_marker_index = get_task_history(state)
     messages = [SystemMessage(content=ANALYST_PROMPT)] + relevant_msgs
     result = analyst_agent.invoke({"messages": messages})
     new_msgs = result["messages"][len(messages):]
     
     parse_and_log_tools(state.get("session_id", "unknown"), "AnalystAgent", new_msgs)
     
-    return {"messages": new_msgs}
+    return {"messages": new_msgs, "task_marker_index": task_marker_index, "last_ai_content": get_last_ai_content(new_msgs)}
     
 
 
-@traceable(run_type="chain", name="formatter_node")
+@_maybe_traceable(run_type="chain", name="formatter_node")
 def formatter_node(state: AgentState):
     """
     Formats and saves the final output to a file.
@@ -399,7 +534,7 @@ def formatter_node(state: AgentState):
     2. Scans the output for success confirmation.
     3. Emits a 'client_action' (show_download) if a file was saved.
     """
-    relevant_msgs = strip_old_history(state['messages'])
+    relevant_msgs, task_marker_index = get_task_history(state)
     messages = [SystemMessage(content=FORMATTER_PROMPT)] + relevant_msgs
     result = formatter_agent.invoke({"messages": messages})
     new_msgs = result["messages"][len(messages):]
@@ -416,8 +551,7 @@ def formatter_node(state: AgentState):
     actions = []
     if "File saved successfully" in res_text or "PDF saved successfully" in res_text:
         # Extract filename if possible, otherwise default
-        import re
-        match = re.search(r"to (.*)$", res_text)
+        match = _FILEPATH_RE.search(res_text)
         if match:
              filepath = match.group(1).strip()
              filename = os.path.basename(filepath)
@@ -427,10 +561,15 @@ def formatter_node(state: AgentState):
         actions.append({"type": "show_download", "filename": filename})
         actions.append({"type": "confetti"})
         
-    return {"messages": new_msgs, "client_actions": actions}
+    return {
+        "messages": new_msgs,
+        "client_actions": actions,
+        "task_marker_index": task_marker_index,
+        "last_ai_content": get_last_ai_content(new_msgs)
+    }
 
 
-@traceable(run_type="chain", name="chat_node")
+@_maybe_traceable(run_type="chain", name="chat_node")
 def chat_node(state: AgentState):
     """
     Handles general chat interactions (greetings, simple questions).
@@ -442,23 +581,23 @@ def chat_node(state: AgentState):
     # save_turn(sid, "ai", response.content) # Handled by LangGraph state
 
         
-    return {"messages": [response], "is_plan_done": True}
+    return {"messages": [response], "is_plan_done": True, "last_ai_content": str(response.content)}
 
-@traceable(run_type="chain", name="vector_manager_node")
+@_maybe_traceable(run_type="chain", name="vector_manager_node")
 def vector_manager_node(state: AgentState):
     """
     Manages the Vector Store (ChromaDB) for long-term memory.
     
     Capable of 'Index' (save) and 'Retrieve' (search) operations.
     """
-    relevant_msgs = strip_old_history(state['messages'])
+    relevant_msgs, task_marker_index = get_task_history(state)
     messages = [SystemMessage(content=VECTOR_MANAGER_PROMPT)] + relevant_msgs
     result = vector_manager_agent.invoke({"messages": messages})
     new_msgs = result["messages"][len(messages):]
     
     parse_and_log_tools(state.get("session_id", "unknown"), "VectorStoreAgent", new_msgs)
     
-    return {"messages": new_msgs}
+    return {"messages": new_msgs, "task_marker_index": task_marker_index, "last_ai_content": get_last_ai_content(new_msgs)}
 
 # --- Graph Construction ---
 workflow = StateGraph(AgentState)
@@ -508,6 +647,47 @@ workflow.add_edge("ChatAgent", END)
 
 # app = workflow.compile(checkpointer=memory) # Moved to server/client lifecycle
 
+@asynccontextmanager
+async def open_checkpointer():
+    """
+    Opens the persistent checkpointer used by the server/client lifecycle.
+
+    Defaults to a memory-mapped LMDB store (`AsyncLMDBSaver`) so checkpoint reads 
+    on every node transition avoid SQLite's lock contention and fsync latency.
+    Set CHECKPOINT_BACKEND=sqlite to fall back to the legacy `AsyncSqliteSaver` at DB_PATH,
+    and CHECKPOINT_PRAGMAS=wal to open that connection in WAL mode with a larger cache.
+    """
+    backend = os.getenv("CHECKPOINT_BACKEND", "lmdb").lower()
+    if backend == "sqlite":
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+        print(f"Connecting to Checkpoint DB (SQLite): {DB_PATH}")
+        async with aiosqlite.connect(DB_PATH) as conn:
+            # Monkeypatch is_alive for LangGraph compatibility
+            # LangGraph AsyncSqliteSaver checks this but aiosqlite doesn't have it
+            setattr(conn, "is_alive", lambda: True)
+            if os.getenv("CHECKPOINT_PRAGMAS", "").lower() == "wal":
+                for pragma in SQLITE_WAL_PRAGMAS:
+                    await conn.execute(pragma)
+                await conn.commit()
+            yield AsyncSqliteSaver(conn)
+        return
+
+    import lmdb
+    from langgraph_checkpoint_lmdb import AsyncLMDBSaver
+
+    print(f"Connecting to Checkpoint DB (LMDB): {LMDB_PATH}")
+    # Keys (thread_id\x00ns\x00checkpoint_id) and msgpack serialization are handled by the saver
+    env = lmdb.open(LMDB_PATH, map_size=2**32, max_dbs=10)
+    saver = AsyncLMDBSaver(env)
+    try:
+        yield saver
+    finally:
+        # Drain the saver's worker threads before the environment they read/write is closed
+        saver.executor.shutdown(wait=True)
+        env.close()
+
 if __name__ == "__main__":
     # Generate and save the architecture diagram
     from langgraph.checkpoint.memory import MemorySaver
@@ -4,49 +4,129 @@ Logging Utilities
 This module provides structured logging to local text files on a per-session basis.
 It distinguishes between agent-specific activities (tool calls, messages) 
 and system-level events (planning, routing, errors).
+
+Session files are held open (buffered) and flushed by a background thread, 
+so logging a tool call does not cost an open()/close() pair. At most 
+MAX_OPEN_LOGS handles stay open; the least recently used session is closed first.
 """
 import os
-from datetime import datetime
-from typing import Optional, Dict, Any
+import io
+import time
+import atexit
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
 
 LOG_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "logs"))
+FLUSH_INTERVAL = 0.5 # Seconds between background flushes
 
 if not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR)
 
+# Entry templates: each entry is built with a single %-format instead of repeated concatenation
+_SEP = "-" * 40 + "\n"
+_SYS_SEP = "=" * 40 + "\n"
+_ACT_TMPL = "[%s] [%s]%s%s\nMessage: %s\n%s" + _SEP
+_SYS_TMPL = "[%s] [SYSTEM:%s]\nDetails: %s\n" + _SYS_SEP
+
+MAX_OPEN_LOGS = int(os.getenv("MAX_OPEN_LOGS", "64")) # Open session handles kept before the least recent is closed
+
+class _SessionWriter:
+    """A session's buffered log handle and the lock serializing writes/flushes on it."""
+    __slots__ = ("handle", "lock")
+
+    def __init__(self, path: str):
+        self.handle: io.TextIOWrapper = open(path, "a", buffering=1 << 16, encoding="utf-8")
+        self.lock = threading.Lock()
+
+# LRU of open writers (most recently used last); the registry lock only guards the dict itself
+_WRITERS: "OrderedDict[str, _SessionWriter]" = OrderedDict()
+_WRITERS_LOCK = threading.Lock()
+
+# (epoch second, formatted timestamp); swapped as one tuple so concurrent readers never see a torn pair
+_ts_cache = (0, "")
+
+def _now() -> str:
+    """Returns the current local time as 'YYYY-MM-DD HH:MM:SS', formatted at most once per second."""
+    global _ts_cache
+    s = int(time.time())
+    if s != _ts_cache[0]:
+        _ts_cache = (s, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(s)))
+    return _ts_cache[1]
+
 def get_log_path(session_id: str) -> str:
     """Returns the absolute path to the log file for a given session."""
     return os.path.abspath(os.path.join(LOG_DIR, f"session_{session_id}.txt"))
 
+def _get_writer(session_id: str) -> _SessionWriter:
+    """Returns the cached writer for a session, opening it on first use and closing the least recent one beyond MAX_OPEN_LOGS."""
+    evicted = []
+    with _WRITERS_LOCK:
+        writer = _WRITERS.get(session_id)
+        if writer is None:
+            writer = _SessionWriter(get_log_path(session_id))
+            _WRITERS[session_id] = writer
+            while len(_WRITERS) > MAX_OPEN_LOGS:
+                evicted.append(_WRITERS.popitem(last=False)[1])
+        else:
+            _WRITERS.move_to_end(session_id)
+    for old in evicted:
+        with old.lock:
+            old.handle.close()
+    return writer
+
+def _write_lines(session_id: str, entries: List[str]):
+    """Appends pre-formatted entries to the session's buffered handle under its own lock."""
+    while True:
+        writer = _get_writer(session_id)
+        with writer.lock:
+            # The writer may have been evicted (and closed) between lookup and lock; reopen
+            if not writer.handle.closed:
+                writer.handle.writelines(entries)
+                return
+
+def _write(session_id: str, entry: str):
+    """Appends a single pre-formatted entry to the session log."""
+    _write_lines(session_id, (entry,))
+
+def log_entries(session_id: str, entries: List[str]):
+    """Appends a batch of pre-formatted entries (see `format_activity`) in a single write."""
+    if entries:
+        _write_lines(session_id, entries)
+
+def flush_logs():
+    """Flushes all open session log handles to disk, each under its own session lock."""
+    with _WRITERS_LOCK:
+        writers = list(_WRITERS.values())
+    for writer in writers:
+        with writer.lock:
+            if not writer.handle.closed:
+                writer.handle.flush()
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        flush_logs()
+
+threading.Thread(target=_flush_loop, name="session-log-flusher", daemon=True).start()
+atexit.register(flush_logs)
+
+def format_activity(agent_name: str, message: str, tool_name: Optional[str] = None, tool_args: Optional[Dict[str, Any]] = None, status: Optional[str] = None) -> str:
+    """Formats a structured activity entry without writing it."""
+    return _ACT_TMPL % (
+        _now(),
+        agent_name,
+        f" [TOOL: {tool_name}]" if tool_name else "",
+        f" [STATUS: {status}]" if status else "",
+        message,
+        f"Arguments: {tool_args}\n" if tool_args else "",
+    )
+
 def log_activity(session_id: str, agent_name: str, message: str, tool_name: Optional[str] = None, tool_args: Optional[Dict[str, Any]] = None, status: Optional[str] = None):
     """Appends a structured log entry to the session log file."""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_path = get_log_path(session_id)
-    
-    log_entry = f"[{timestamp}] [{agent_name}]"
-    if tool_name:
-        log_entry += f" [TOOL: {tool_name}]"
-    if status:
-        log_entry += f" [STATUS: {status}]"
-    
-    log_entry += f"\nMessage: {message}\n"
-    
-    if tool_args:
-        log_entry += f"Arguments: {tool_args}\n"
-    
-    log_entry += "-" * 40 + "\n"
-    
-    with open(log_path, "a", encoding="utf-8") as f:
-        f.write(log_entry)
+    _write(session_id, format_activity(agent_name, message, tool_name, tool_args, status))
 
 def log_system_event(session_id: str, event_type: str, message: str):
     """Logs a system-level event (routing, planning, errors)."""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_path = get_log_path(session_id)
-    
-    log_entry = f"[{timestamp}] [SYSTEM:{event_type}]\n"
-    log_entry += f"Details: {message}\n"
-    log_entry += "=" * 40 + "\n"
-    
-    with open(log_path, "a", encoding="utf-8") as f:
-        f.write(log_entry)
+    log_entry = _SYS_TMPL % (_now(), event_type, message)
+    _write(session_id, log_entry)
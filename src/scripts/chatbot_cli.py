@@ -3,7 +3,7 @@ Agent Command Line Interface.
 
 This script allows direct interaction with the LangGraph multi-agent system from 
 the terminal. It supports real-time event streaming, node tracing, and 
-session persistence via a local SQLite checkpointer.
+session persistence via a local LMDB (or SQLite) checkpointer.
 """
 
 import asyncio
@@ -12,13 +12,11 @@ import sys
 import os
 import json
 import argparse
-import aiosqlite
 
 # Add root to pass to find 'agent'
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, SystemMessage
-from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
-from agent.graph import workflow, DB_PATH
+from agent.graph import workflow, open_checkpointer
 from agent.logging_utils import get_log_path
 
 async def run_cli():
@@ -37,9 +35,7 @@ async def run_cli():
         
     print(f"Log File: {get_log_path(thread_id)}\n")
 
-    async with aiosqlite.connect(DB_PATH) as conn:
-        setattr(conn, "is_alive", lambda: True)
-        checkpointer = AsyncSqliteSaver(conn)
+    async with open_checkpointer() as checkpointer:
         agent_app = workflow.compile(checkpointer=checkpointer)
 
         # Load history if resuming
@@ -27,10 +27,8 @@ if root_dir not in sys.path:
 
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from contextlib import asynccontextmanager
-from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
-from agent.graph import workflow, DB_PATH
+from agent.graph import workflow, open_checkpointer
 from agent.tools import index_content
-import aiosqlite
 from fastapi import UploadFile, File
 import io
 import pypdf
@@ -43,22 +41,15 @@ async def lifespan(app: FastAPI):
     Manages the FastAPI application lifespan.
     
     Startup:
-    1. Connects to the SQLite database using aiosqlite.
-    2. Monkeypatches the `is_alive` attribute onto the connection for LangGraph compatibility.
-    3. Initializes the AsyncSqliteSaver checkpointer.
-    4. Compiles the LangGraph workflow with the checkpointer.
+    1. Opens the checkpoint store (LMDB by default, SQLite if CHECKPOINT_BACKEND=sqlite).
+    2. Compiles the LangGraph workflow with the checkpointer.
     
     Shutdown:
-    - Closes the DB connection automatically (via context manager).
+    - Closes the checkpoint store automatically (via context manager).
     """
     # Startup: Open DB and Compile Agent
-    print(f"Server Startup. Connecting to Checkpoint DB: {DB_PATH}")
-    async with aiosqlite.connect(DB_PATH) as conn:
-        # Monkeypatch is_alive for LangGraph compatibility
-        # LangGraph AsyncSqliteSaver checks this but aiosqlite doesn't have it
-        setattr(conn, "is_alive", lambda: True)
-        
-        checkpointer = AsyncSqliteSaver(conn)
+    print("Server Startup.")
+    async with open_checkpointer() as checkpointer:
         app.state.agent = workflow.compile(checkpointer=checkpointer)
         yield
     print("Server Shutdown.")
@@ -2,15 +2,21 @@
 Agent Tests.
 
 This module provides unit tests for the LangGraph multi-agent system.
-It tests the supervisor node and its routing logic.
+It tests the supervisor node and its routing logic (live LLM), plus offline 
+tests for the history scanning helpers.
 """
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import pytest
-from agent.graph import supervisor_node
-from langchain_core.messages import HumanMessage
+import agent.graph as graph
+from agent.graph import (
+    supervisor_node, _compile_prompt, _scan_state, get_task_history, get_last_ai_content,
+    strip_old_history, keep_latest, retrieve_bounded, RouterResponse, AgentState
+)
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
+from langgraph.graph import StateGraph, END
 
 def test_supervisor_routing_research():
     state = {"messages": [HumanMessage(content="Research LangGraph")], "plan": "Research LangGraph", "is_plan_done": False}
@@ -47,3 +53,179 @@ def test_supervisor_routing_fallback():
     result = supervisor_node(state)
     # The supervisor logic routes small talk to ChatAgent
     assert result["next"] == "ChatAgent"
+
+# --- Offline tests (no LLM calls) ---
+
+def _task_history():
+    """Two task blocks; the second block has no AIMessage of its own yet."""
+    return [
+        HumanMessage(content="Find papers"),
+        SystemMessage(content="--- NEW TASK START: Find papers ---"),
+        AIMessage(content="Title: Paper A. SELECTED: Paper A"),
+        HumanMessage(content="Now something else"),
+        SystemMessage(content="--- NEW TASK START: Now something else ---"),
+        HumanMessage(content="Abstract: pending"),
+    ]
+
+def test_scan_state_finds_marker_without_cached_index():
+    msgs = _task_history()
+    relevant, index, last_ai, has_content, has_selection = _scan_state(msgs)
+    assert index == 4
+    assert relevant == msgs[4:]
+    assert relevant == strip_old_history(msgs)
+    assert has_content and not has_selection
+
+def test_scan_state_uses_cached_index():
+    msgs = _task_history()
+    # A cached index is trusted even if a later marker exists (the Planner owns it)
+    relevant, index, _, has_content, has_selection = _scan_state(msgs, marker_index=1)
+    assert index == 1
+    assert relevant == msgs[1:]
+    assert has_content and has_selection
+
+def test_scan_state_stale_index_falls_back_to_scan():
+    msgs = _task_history()
+    relevant, index, *_ = _scan_state(msgs, marker_index=len(msgs) + 5)
+    assert index == 4
+    assert relevant == msgs[4:]
+
+def test_scan_state_last_ai_before_task_block():
+    msgs = _task_history()
+    _, _, last_ai, *_ = _scan_state(msgs)
+    assert last_ai == "Title: Paper A. SELECTED: Paper A"
+    # A value already known from state is returned unchanged
+    _, _, last_ai, *_ = _scan_state(msgs, last_ai_content="from state")
+    assert last_ai == "from state"
+
+def test_scan_state_no_marker_no_ai():
+    msgs = [HumanMessage(content="hello")]
+    relevant, index, last_ai, has_content, has_selection = _scan_state(msgs)
+    assert (relevant, index, last_ai, has_content, has_selection) == (msgs, 0, None, False, False)
+
+def test_get_task_history_cached_and_stale_index():
+    msgs = _task_history()
+    assert get_task_history({"messages": msgs, "task_marker_index": 1}) == (msgs[1:], 1)
+    assert get_task_history({"messages": msgs}) == (msgs[4:], 4)
+    assert get_task_history({"messages": msgs, "task_marker_index": 99}) == (msgs[4:], 4)
+
+def test_keep_latest_reducer():
+    assert keep_latest("old", "new") == "new"
+    # An empty final AIMessage is a real result; only None (no AIMessage) keeps the previous value
+    assert keep_latest("old", "") == ""
+    assert keep_latest("old", None) == "old"
+
+def test_get_last_ai_content_empty_final_message():
+    tool_call = {"name": "save_file", "args": {}, "id": "c1", "type": "tool_call"}
+    worker_msgs = [AIMessage(content="Researcher found X", tool_calls=[tool_call]), ToolMessage(content="ok", tool_call_id="c1"), AIMessage(content="")]
+    assert get_last_ai_content(worker_msgs) == ""
+    assert get_last_ai_content([HumanMessage(content="no ai")]) is None
+
+def test_last_ai_content_channel_in_graph():
+    def node(update):
+        return lambda state: update
+    
+    builder = StateGraph(AgentState)
+    builder.add_node("researcher", node({"last_ai_content": "Researcher found X"}))
+    builder.add_node("formatter", node({"last_ai_content": ""}))
+    builder.add_node("no_ai", node({"last_ai_content": None}))
+    builder.set_entry_point("researcher")
+    builder.add_edge("researcher", "formatter")
+    builder.add_edge("formatter", "no_ai")
+    builder.add_edge("no_ai", END)
+    assert builder.compile().invoke({"messages": []})["last_ai_content"] == ""
+    
+    # Unset until a worker reports it, so the Supervisor falls back to scanning history
+    empty = StateGraph(AgentState)
+    empty.add_node("noop", node({}))
+    empty.set_entry_point("noop")
+    empty.add_edge("noop", END)
+    assert "last_ai_content" not in empty.compile().invoke({"messages": []})
+
+def test_compile_prompt_matches_format_and_rejects_specs():
+    template = "Step {active_step_index}: {plan}\n{{literal}}"
+    values = {"active_step_index": 2, "plan": ["a", "b"]}
+    assert _compile_prompt(template)(**values) == template.format(**values)
+    for bad in ("{plan!r}", "{active_step_index:>5}"):
+        with pytest.raises(ValueError):
+            _compile_prompt(bad)
+
+class _StubRouter:
+    """Stands in for the structured Supervisor LLM and records the prompt it receives."""
+    def __init__(self):
+        self.messages = None
+
+    def invoke(self, messages, config=None):
+        self.messages = messages
+        return RouterResponse(next_worker="Researcher", active_step_index=0, active_step_description="Step", reasoning="stub")
+
+def _run_supervisor(monkeypatch, state):
+    stub = _StubRouter()
+    monkeypatch.setattr(graph, "_STRUCTURED_SUPERVISOR", stub)
+    monkeypatch.setattr(graph, "log_system_event", lambda *args, **kwargs: None)
+    result = graph.supervisor_node(state)
+    return result, stub.messages[0].content
+
+def test_supervisor_last_ai_content_falls_back_to_history(monkeypatch):
+    msgs = _task_history()
+    # No worker has reported last_ai_content yet (missing, or None from a turn without an AIMessage)
+    for extra in ({}, {"last_ai_content": None}):
+        state = {"messages": msgs, "plan": "- Step", "is_plan_done": False, **extra}
+        result, prompt = _run_supervisor(monkeypatch, state)
+        assert "LAST ACTION OUTPUT: Title: Paper A. SELECTED: Paper A" in prompt
+        assert result["task_marker_index"] == 4
+
+def test_supervisor_keeps_empty_last_ai_content(monkeypatch):
+    # The Formatter's turn ended with an empty AIMessage: do not resurface the Analyst's SELECTED block
+    state = {"messages": _task_history(), "plan": "- Step", "is_plan_done": False, "last_ai_content": ""}
+    _, prompt = _run_supervisor(monkeypatch, state)
+    assert "LAST ACTION OUTPUT: \n" in prompt
+    assert "LAST ACTION OUTPUT: Title" not in prompt
+
+def test_scan_state_coerces_list_content():
+    msgs = [AIMessage(content=[{"type": "text", "text": "part"}])]
+    _, _, last_ai, *_ = _scan_state(msgs)
+    assert last_ai == str(msgs[0].content)
+
+def test_supervisor_uses_last_ai_content_from_state(monkeypatch):
+    state = {"messages": _task_history(), "plan": "- Step", "is_plan_done": False, "last_ai_content": "worker said hi", "task_marker_index": 4}
+    _, prompt = _run_supervisor(monkeypatch, state)
+    assert "LAST ACTION OUTPUT: worker said hi" in prompt
+
+
+def _tool_call(call_id):
+    return {"name": "search_arxiv", "args": {"query": "q"}, "id": call_id, "type": "tool_call"}
+
+def test_retrieve_bounded_tail_starting_on_tool_message():
+    msgs = [
+        SystemMessage(content="--- NEW TASK START: goal ---"),
+        HumanMessage(content="goal"),
+        AIMessage(content="", tool_calls=[_tool_call("c1")]),
+        ToolMessage(content="result", tool_call_id="c1"),
+        AIMessage(content="done"),
+    ]
+    # A 2-message tail would start on the ToolMessage; it must reach back to its AIMessage
+    bounded = retrieve_bounded(msgs, n=2)
+    assert bounded == [msgs[0], msgs[2], msgs[3], msgs[4]]
+
+def test_retrieve_bounded_tail_inside_parallel_tool_calls():
+    msgs = [
+        SystemMessage(content="--- NEW TASK START: goal ---"),
+        HumanMessage(content="goal"),
+        AIMessage(content="", tool_calls=[_tool_call("c1"), _tool_call("c2"), _tool_call("c3")]),
+        ToolMessage(content="r1", tool_call_id="c1"),
+        ToolMessage(content="r2", tool_call_id="c2"),
+        ToolMessage(content="r3", tool_call_id="c3"),
+        AIMessage(content="summary"),
+    ]
+    bounded = retrieve_bounded(msgs, n=3)
+    assert bounded == [msgs[0]] + msgs[2:]
+    # Every ToolMessage sent still follows the AIMessage that issued it
+    first_tool = next(i for i, m in enumerate(bounded) if isinstance(m, ToolMessage))
+    assert isinstance(bounded[first_tool - 1], AIMessage) and bounded[first_tool - 1].tool_calls
+
+def test_retrieve_bounded_unbounded_or_short_history():
+    msgs = [SystemMessage(content="--- NEW TASK START: goal ---"), HumanMessage(content="goal"), AIMessage(content="ok")]
+    assert retrieve_bounded(msgs, n=0) is msgs
+    assert retrieve_bounded(msgs, n=3) is msgs
+    assert retrieve_bounded(msgs, n=12) is msgs
+    assert retrieve_bounded([], n=2) == []
@@ -0,0 +1,103 @@
+"""
+Logging Utilities Tests.
+
+Offline tests for the buffered per-session log writers: LRU eviction of open 
+handles, per-session locking under concurrent writers, and parity with the 
+original open/append/close entry format.
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import threading
+from collections import OrderedDict
+
+import pytest
+from agent import logging_utils
+
+TIMESTAMP = "2026-01-01 00:00:00"
+
+def _legacy_activity(agent_name, message, tool_name=None, tool_args=None, status=None):
+    """The original log_activity entry format (before buffered writers)."""
+    log_entry = f"[{TIMESTAMP}] [{agent_name}]"
+    if tool_name:
+        log_entry += f" [TOOL: {tool_name}]"
+    if status:
+        log_entry += f" [STATUS: {status}]"
+    log_entry += f"\nMessage: {message}\n"
+    if tool_args:
+        log_entry += f"Arguments: {tool_args}\n"
+    log_entry += "-" * 40 + "\n"
+    return log_entry
+
+def _legacy_system(event_type, message):
+    """The original log_system_event entry format."""
+    log_entry = f"[{TIMESTAMP}] [SYSTEM:{event_type}]\n"
+    log_entry += f"Details: {message}\n"
+    log_entry += "=" * 40 + "\n"
+    return log_entry
+
+@pytest.fixture
+def isolated_logs(tmp_path, monkeypatch):
+    """Points the logger at tmp_path with a fresh writer cache capped at 2 handles."""
+    monkeypatch.setattr(logging_utils, "LOG_DIR", str(tmp_path))
+    monkeypatch.setattr(logging_utils, "MAX_OPEN_LOGS", 2)
+    monkeypatch.setattr(logging_utils, "_WRITERS", OrderedDict())
+    monkeypatch.setattr(logging_utils, "_now", lambda: TIMESTAMP)
+    yield tmp_path
+    logging_utils.flush_logs()
+    for writer in list(logging_utils._WRITERS.values()):
+        with writer.lock:
+            writer.handle.close()
+
+def test_concurrent_writes_with_eviction(isolated_logs):
+    sessions = [f"s{k}" for k in range(7)]
+    n_threads, n_per_thread = 8, 2000
+
+    def work(t):
+        for j in range(n_per_thread):
+            sid = sessions[(t + j) % len(sessions)]
+            if j % 2:
+                logging_utils.log_system_event(sid, "ROUTING", f"t{t}-{j}")
+            else:
+                logging_utils.log_entries(sid, [logging_utils.format_activity("Researcher", f"t{t}-{j}")])
+
+    threads = [threading.Thread(target=work, args=(t,)) for t in range(n_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    logging_utils.flush_logs()
+
+    assert len(logging_utils._WRITERS) <= 2
+    open_handles = [w for w in logging_utils._WRITERS.values() if not w.handle.closed]
+    assert len(open_handles) <= 2
+
+    contents = [open(logging_utils.get_log_path(sid), encoding="utf-8").read() for sid in sessions]
+    total = sum(c.count("\nMessage: ") + c.count("\nDetails: ") for c in contents)
+    assert total == n_threads * n_per_thread
+    # Entries are never interleaved: every entry ends with its own separator
+    assert sum(c.count("-" * 40 + "\n") + c.count("=" * 40 + "\n") for c in contents) == total
+
+def test_output_matches_legacy_format(isolated_logs):
+    expected = {}
+    calls = [
+        ("a", dict(agent_name="Researcher", message="Output: x...", tool_name="search_arxiv", tool_args={"query": "q"}, status="SUCCESS")),
+        ("b", dict(agent_name="AnalystAgent", message="SELECTED: Paper 1")),
+        ("c", dict(agent_name="Formatter", message="saved", tool_name="save_file")),
+        ("a", dict(agent_name="Researcher", message="done", status="FAILED")),
+    ]
+    for sid, kwargs in calls:
+        logging_utils.log_activity(sid, **kwargs)
+        expected[sid] = expected.get(sid, "") + _legacy_activity(**kwargs)
+    logging_utils.log_system_event("b", "PLANNING", "Planner called with goal: x")
+    expected["b"] += _legacy_system("PLANNING", "Planner called with goal: x")
+    # Batched entries land in order, identical to individual log_activity calls
+    batch = [dict(agent_name="VectorStoreAgent", message=f"m{k}") for k in range(3)]
+    logging_utils.log_entries("c", [logging_utils.format_activity(**kw) for kw in batch])
+    expected["c"] += "".join(_legacy_activity(**kw) for kw in batch)
+
+    logging_utils.flush_logs()
+    # Session "a" was evicted (cap of 2) and reopened in append mode along the way
+    for sid, text in expected.items():
+        assert open(logging_utils.get_log_path(sid), encoding="utf-8").read() == text